@@ -13,6 +13,15 @@ GEMINI_SAFETY_SETTINGS = {
     HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE
 }
 
+# Rate limit and retry settings (match these to your API quota)
+GEMINI_REQUESTS_PER_MINUTE = 15
+GEMINI_TOKENS_PER_MINUTE = 1000000
+GEMINI_MAX_RETRIES = 5
+GEMINI_RETRY_BASE_DELAY = 2  # seconds
+GEMINI_RETRY_MAX_DELAY = 60  # seconds
+GEMINI_REQUEST_TIMEOUT = 120  # seconds per attempt
+GEMINI_REQUEST_DEADLINE = 300  # seconds per call, including retries
+
 # System prompts
 SUMMARY_SYSTEM_PROMPT = """
 You are an expert study assistant. Extract key points from educational materials and create concise, 
@@ -35,6 +44,13 @@ When provided with conversation history, use it to understand the context of the
 # Text chunking settings (for context window)
 MAX_CHUNK_SIZE = 30000
 
+# Course library index settings
+LIBRARY_INDEX_DIR = os.path.join(os.path.expanduser("~"), ".reviewer", "library")
+LIBRARY_CHUNK_SIZE = 4000
+LIBRARY_VECTOR_DIM = 4096
+LIBRARY_TOP_K = 5
+LIBRARY_COMPACT_RATIO = 0.25  # compact when this share of rows is outdated
+
 # Supported file formats
 SUPPORTED_FILE_FORMATS = {
     '.pdf': 'PDF Document',
@@ -1,4 +1,5 @@
 import os
+import hashlib
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
 from langchain_core.messages import HumanMessage, SystemMessage
@@ -8,16 +9,28 @@ from config.settings import (
     GEMINI_TEMPERATURE,
     GEMINI_MAX_OUTPUT_TOKENS,
     GEMINI_SAFETY_SETTINGS,
+    GEMINI_REQUESTS_PER_MINUTE,
+    GEMINI_TOKENS_PER_MINUTE,
+    GEMINI_MAX_RETRIES,
+    GEMINI_RETRY_BASE_DELAY,
+    GEMINI_RETRY_MAX_DELAY,
+    GEMINI_REQUEST_TIMEOUT,
+    GEMINI_REQUEST_DEADLINE,
     SUMMARY_SYSTEM_PROMPT,
     QA_SYSTEM_PROMPT
 )
 from core.text_chunker import chunk_text
+from core.rate_limiter import RateLimiter, invoke_with_retry
 
 model = None
+limiter = None
+# per-chunk responses of the latest operation of each kind ("summary", "question"),
+# so retrying it after a failure only redoes the failed chunks
+partial_results = {}
 
 def initialize_model():
     """Initialize the LLM model."""
-    global model
+    global model, limiter
     if model is None:
         gemini_api_key = os.getenv("GEMINI_API_KEY")
         model = ChatGoogleGenerativeAI(
@@ -25,10 +38,46 @@ def initialize_model():
             google_api_key=gemini_api_key,
             temperature=GEMINI_TEMPERATURE,
             max_output_tokens=GEMINI_MAX_OUTPUT_TOKENS,
-            safety_settings=GEMINI_SAFETY_SETTINGS
+            safety_settings=GEMINI_SAFETY_SETTINGS,
+            timeout=GEMINI_REQUEST_TIMEOUT,
+            # retries are handled by invoke_with_retry
+            max_retries=0
         )
+    if limiter is None:
+        limiter = RateLimiter(GEMINI_REQUESTS_PER_MINUTE, GEMINI_TOKENS_PER_MINUTE)
     return model
 
+def invoke_model(messages):
+    """Invoke the model with rate limiting and retries."""
+    response = invoke_with_retry(
+        model,
+        messages,
+        limiter,
+        max_retries=GEMINI_MAX_RETRIES,
+        base_delay=GEMINI_RETRY_BASE_DELAY,
+        max_delay=GEMINI_RETRY_MAX_DELAY,
+        deadline_seconds=GEMINI_REQUEST_DEADLINE,
+        attempt_timeout=GEMINI_REQUEST_TIMEOUT,
+        max_output_tokens=GEMINI_MAX_OUTPUT_TOKENS
+    )
+    return response.content
+
+def get_operation_key(*parts):
+    """Identify an operation by its inputs."""
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+def invoke_chunk(kind, operation, i, messages):
+    """Invoke the model for one chunk of an operation, reusing the result from an earlier failed run.
+
+    Only the latest operation of each kind is kept, so starting a different one drops the old results.
+    """
+    if kind not in partial_results or partial_results[kind]["operation"] != operation:
+        partial_results[kind] = {"operation": operation, "results": {}}
+    results = partial_results[kind]["results"]
+    if i not in results:
+        results[i] = invoke_model(messages)
+    return results[i]
+
 def summarize_text_to_bullets(text):
     """Summarize the extracted text into bullet points."""
     # Initialize the model if not already done
@@ -39,6 +88,7 @@ def summarize_text_to_bullets(text):
     
     if len(chunks) > 1:
         print(f"\nContent is large, processing in {len(chunks)} parts...")
+        operation = get_operation_key("summary", text)
         all_summaries = []
         
         for i, chunk in enumerate(chunks, 1):
@@ -63,8 +113,8 @@ Do not use any other formatting, just plain bullet points and text.
             ]
             
             # generate response
-            response = model.invoke(messages)
-            all_summaries.append(response.content)
+            response = invoke_chunk("summary", operation, i, messages)
+            all_summaries.append(response)
         
         # If we have multiple chunks, combine the summaries
         if len(all_summaries) > 1:
@@ -89,9 +139,11 @@ Do not use any other formatting, just plain bullet points and text.
             ]
             
             # Generate combined response
-            response = model.invoke(messages)
-            return response.content
+            response = invoke_model(messages)
+            partial_results.pop("summary", None)
+            return response
         else:
+            partial_results.pop("summary", None)
             return all_summaries[0]
     else:
         # If the text doesn't need chunking, process it as normal
@@ -114,27 +166,33 @@ Do not use any other formatting, just plain bullet points and text.
         ]
         
         # generate response
-        response = model.invoke(messages)
-        return response.content
+        response = invoke_model(messages)
+        return response
 
-def answer_question(text, question, conversation_history):
-    """Answer a question based on the document content and conversation context"""
-    # Initialize the model if not already done
-    initialize_model()
-    
-    # conversation context 
+def format_conversation_context(conversation_history):
+    """Format the previous questions and answers for the prompt."""
     conversation_context = ""
     if len(conversation_history) > 0:
         conversation_context = "Previous conversation:\n"
         for i, exchange in enumerate(conversation_history, 1):
             conversation_context += f"Question {i}: {exchange['question']}\n"
             conversation_context += f"Answer {i}: {exchange['answer']}\n\n"
+    return conversation_context
+
+def answer_question(text, question, conversation_history):
+    """Answer a question based on the document content and conversation context"""
+    # Initialize the model if not already done
+    initialize_model()
+    
+    # conversation context 
+    conversation_context = format_conversation_context(conversation_history)
 
     # check if text needs to be chunked
     chunks = chunk_text(text)
     
     if len(chunks) > 1:
         print(f"\nContent is large, searching across {len(chunks)} sections...")
+        operation = get_operation_key("question", text, question, conversation_context)
         all_answers = []
         
         for i, chunk in enumerate(chunks, 1):
@@ -158,9 +216,9 @@ If the answer cannot be determined from this section, simply state "No relevant
             ]
             
             # generate response
-            response = model.invoke(messages)
-            if "No relevant information found in this section" not in response.content:
-                all_answers.append(response.content)
+            response = invoke_chunk("question", operation, i, messages)
+            if "No relevant information found in this section" not in response:
+                all_answers.append(response)
         
         # If we found answers in multiple chunks, combine them
         if all_answers:
@@ -186,11 +244,14 @@ If the question refers to previous questions or answers, use the conversation co
                 ]
                 
                 # generate combined response
-                response = model.invoke(messages)
-                return response.content
+                response = invoke_model(messages)
+                partial_results.pop("question", None)
+                return response
             else:
+                partial_results.pop("question", None)
                 return all_answers[0]
         else:
+            partial_results.pop("question", None)
             return "I couldn't find information relevant to your question in the document."
     else:
         # If the text doesnt need chunking, process it as normal
@@ -213,5 +274,48 @@ If the answer cannot be determined from the text, state that clearly.
         ]
         
         # generate response
-        response = model.invoke(messages)
-        return response.content
+        response = invoke_model(messages)
+        return response
+
+def answer_question_from_library(index, question, conversation_history):
+    """Answer a question using the most relevant sections across the course library"""
+    # Initialize the model if not already done
+    initialize_model()
+
+    conversation_context = format_conversation_context(conversation_history)
+
+    # include the previous question so follow-ups find the sections being discussed
+    search_query = question
+    if len(conversation_history) > 0:
+        search_query = f"{conversation_history[-1]['question']} {question}"
+
+    # only send the top matching sections to the model
+    results = index.search(search_query)
+    if not results:
+        return "I couldn't find information relevant to your question in the library."
+
+    sources = "\n\n".join(
+        f"[Source: {os.path.basename(result['path'])}, section {result['section']}]\n{result['text']}"
+        for result in results
+    )
+    messages = [
+        SystemMessage(content=QA_SYSTEM_PROMPT),
+        HumanMessage(content=f"""
+Given the following sections from a library of study documents and a question, provide a comprehensive and accurate answer based solely on the information in these sections.
+
+{conversation_context}
+Sections:
+{sources}
+
+Current Question:
+{question}
+
+Answer the question directly and concisely, and mention which document the information comes from.
+If the question refers to previous questions or answers, use the conversation context to provide continuity and context-aware responses.
+If the answer cannot be determined from these sections, state that clearly.
+""")
+    ]
+
+    # generate response
+    response = invoke_model(messages)
+    return response
@@ -1,7 +1,8 @@
+import os
 import textwrap
 import sys
 
-from core.ai_service import answer_question
+from core.ai_service import answer_question, answer_question_from_library
 
 def display_menu():
     """Display the menu"""
@@ -10,13 +11,14 @@ def display_menu():
     print("-"*50)
     print("[1] Create Summary and Bullet Points")
     print("[2] Ask Questions About the Document")
-    print("[3] Exit")
+    print("[3] Ask Questions Across the Course Library")
+    print("[4] Exit")
     while True:
         try:
-            choice = int(input("\nEnter your choice (1-3): "))
-            if 1 <= choice <= 3:
+            choice = int(input("\nEnter your choice (1-4): "))
+            if 1 <= choice <= 4:
                 return choice
-            print("Invalid choice. Please enter a number between 1 and 3.")
+            print("Invalid choice. Please enter a number between 1 and 4.")
         except ValueError:
             print("Please enter a valid number.")
 
@@ -30,6 +32,19 @@ def display_qa_menu():
     print("  'back' or 'menu' - Return to main menu")
     print("  'exit' - Exit the program")
 
+def display_library_qa_menu():
+    """Display the course library question-answer mode."""
+    print("\n"+"-"*50)
+    print("Course Library Question - Answer".center(50))
+    print("-"*50)
+    print("Type your question or use one of these commands:")
+    print("  'add <path>' - Add a file or folder to the library")
+    print("  'remove <path>' - Remove a file from the library")
+    print("  'docs' - List the documents in the library")
+    print("  'help' - Show this help message")
+    print("  'back' or 'menu' - Return to main menu")
+    print("  'exit' - Exit the program")
+
 def handle_qa_mode(document_text):
     """Handle the question-answering mode with navigation and context/conversation memory."""
     display_qa_menu()
@@ -74,3 +89,84 @@ def handle_qa_mode(document_text):
         except Exception as e:
             print(f"\nError processing question: {e}")
             print("You can try another question or type 'back' to return to the menu")
+
+def handle_library_qa_mode(index):
+    """Handle question-answering across every document in the course library."""
+    display_library_qa_menu()
+
+    conversation_history = []
+
+    while True:
+        question = input("\nAsk a question: ").strip()
+
+        # Handle commands
+        if question.lower() in ['back', 'menu']:
+            print("\nReturning to menu...")
+            return
+        elif question.lower() == 'exit':
+            print("\nExiting program.. Goodbye!")
+            sys.exit(0)
+        elif question.lower() == 'help':
+            display_library_qa_menu()
+            continue
+        elif question.lower() == 'docs':
+            print(f"\n{len(index.documents)} document(s) in the library:")
+            for path in index.documents:
+                print(f"  {path}")
+            continue
+        elif question.lower().startswith('add '):
+            path = question[4:].strip()
+            if os.path.isdir(path):
+                print(f"\nIndexing documents in {path}, please wait...")
+                try:
+                    updated = index.add_directory(path)
+                    print(f"{updated} document(s) added or updated.")
+                except Exception as e:
+                    print(f"Error indexing documents: {e}")
+            elif os.path.isfile(path):
+                print(f"\nIndexing {path}, please wait...")
+                try:
+                    if index.add_document(path):
+                        print("Document added to the library.")
+                    else:
+                        print("Document is already up to date in the library.")
+                except Exception as e:
+                    print(f"Error indexing document: {e}")
+            else:
+                print(f"Error: '{path}' does not exist")
+            continue
+        elif question.lower().startswith('remove '):
+            path = question[7:].strip()
+            try:
+                if index.remove_document(path):
+                    print("Document removed from the library.")
+                else:
+                    print(f"Error: '{path}' is not in the library")
+            except Exception as e:
+                print(f"Error removing document: {e}")
+            continue
+        elif not question:
+            print("Please enter a question or command.")
+            continue
+
+        # Process question
+        print("\nThinking...")
+        try:
+            answer = answer_question_from_library(index, question, conversation_history)
+
+            # add to conversation history (last 5 interactions)
+            conversation_history.append({"question": question, "answer": answer})
+            if len(conversation_history) > 5:
+                conversation_history.pop(0)
+
+            print("\nAnswer:")
+            # Print the answer with proper wrapping
+            for line in textwrap.wrap(str(answer), width=80):
+                print(line)
+
+            print("\n" + "-"*50)
+            print("Type another question, 'back' for menu, or 'help' for options")
+
+        except Exception as e:
+            print(f"\nError processing question: {e}")
+            print("You can try another question or type 'back' to return to the menu")
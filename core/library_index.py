@@ -0,0 +1,372 @@
+import os
+import re
+import json
+import zlib
+import numpy as np
+
+from config.settings import (
+    LIBRARY_INDEX_DIR,
+    LIBRARY_CHUNK_SIZE,
+    LIBRARY_VECTOR_DIM,
+    LIBRARY_TOP_K,
+    LIBRARY_COMPACT_RATIO,
+    SUPPORTED_FILE_FORMATS
+)
+from core.document_processor import process_file
+from core.text_chunker import chunk_text
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# common words that never make a chunk relevant on their own
+STOP_WORDS = {
+    "a", "about", "an", "and", "are", "as", "at", "be", "but", "by", "can", "do", "does", "explain",
+    "for", "from", "how", "i", "if", "in", "is", "it", "me", "more", "of", "on", "or", "so", "tell",
+    "that", "the", "their", "there", "these", "this", "to", "was", "what", "when", "where", "which",
+    "who", "why", "will", "with", "you"
+}
+# rows read at once when scanning the whole vectors file
+SCAN_BLOCK_ROWS = 4096
+
+def vectorize_text(text, dim=LIBRARY_VECTOR_DIM):
+    """Turn text into a normalized hashed term-frequency vector."""
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    if not tokens:
+        return np.zeros(dim, dtype=np.float32)
+    # crc32 is stable across runs, unlike hash()
+    buckets = [zlib.crc32(token.encode("utf-8")) % dim for token in tokens]
+    vector = np.log1p(np.bincount(buckets, minlength=dim).astype(np.float32))
+    return vector / np.linalg.norm(vector)
+
+def hash_terms(terms):
+    """Hash terms to stable 32-bit ids, wide enough that different terms practically never collide."""
+    return np.unique(np.array([zlib.crc32(term.encode("utf-8")) for term in terms], dtype=np.uint32))
+
+def append_to_file(path, size, data):
+    """Append data to a file, first dropping anything past the expected size.
+
+    Bytes left over from an interrupted write are never part of the index,
+    so cutting them off keeps rows lined up with the metadata.
+    """
+    with open(path, "ab"):
+        pass
+    with open(path, "r+b") as file:
+        file.truncate(size)
+        file.seek(0, os.SEEK_END)
+        file.write(data)
+
+class LibraryIndex:
+    """Persistent index of chunks across many documents, stored on disk.
+
+    Chunk vectors, chunk text, the hashed terms of each chunk and the offsets of
+    each chunk's text and terms are kept in append-only files, with vectors
+    memory-mapped for search. A small
+    JSON file holds the per-document metadata and is replaced atomically, so the
+    index on disk always matches the last successful save. Rows of removed or
+    re-indexed documents are dropped by compacting into a new generation of files.
+    """
+
+    def __init__(self, index_dir=None, dim=LIBRARY_VECTOR_DIM):
+        self.index_dir = index_dir or os.getenv("LIBRARY_INDEX_DIR") or LIBRARY_INDEX_DIR
+        self.dim = dim
+        self.metadata_path = os.path.join(self.index_dir, "metadata.json")
+        self._matrix = None
+        self._offsets = None
+        self._terms = None
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        if os.path.exists(self.metadata_path):
+            with open(self.metadata_path, "r", encoding="utf-8") as file:
+                self.metadata = json.load(file)
+            if self.metadata["dim"] != self.dim:
+                raise ValueError(
+                    f"Library index at '{self.index_dir}' uses {self.metadata['dim']} dimensions, expected {self.dim}"
+                )
+        else:
+            self.metadata = {
+                "dim": self.dim, "generation": 0, "num_rows": 0, "text_bytes": 0, "num_terms": 0, "documents": {}
+            }
+        self._load_rows()
+
+        # document frequencies are recomputed rather than stored, so they always match the rows
+        self.doc_freq = np.zeros(self.dim, dtype=np.int64)
+        matrix = self._load_matrix()
+        for start in range(0, self.metadata["num_rows"], SCAN_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + SCAN_BLOCK_ROWS])
+            active = self.active[start:start + SCAN_BLOCK_ROWS, None]
+            self.doc_freq += ((block > 0) & active).sum(axis=0)
+
+    @property
+    def documents(self):
+        """Indexed document paths."""
+        return list(self.metadata["documents"])
+
+    def is_current(self, file_path):
+        """Check if the file is indexed and unchanged since it was indexed."""
+        entry = self.metadata["documents"].get(os.path.abspath(file_path))
+        if entry is None:
+            return False
+        stat = os.stat(file_path)
+        return entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size
+
+    def add_document(self, file_path, text=None, save=True):
+        """Index a document, replacing any older version of it.
+
+        Returns False if the document was already indexed and unchanged.
+        """
+        if self.is_current(file_path):
+            return False
+        if text is None:
+            text = process_file(file_path)
+
+        path = os.path.abspath(file_path)
+        self._deactivate(path)
+
+        chunks = [chunk.encode("utf-8") for chunk in chunk_text(text, LIBRARY_CHUNK_SIZE) if chunk.strip()]
+        first_row = self.metadata["num_rows"]
+        text_bytes = self.metadata["text_bytes"]
+        num_terms = self.metadata["num_terms"]
+        terms = []
+        if chunks:
+            texts = [chunk.decode("utf-8") for chunk in chunks]
+            vectors = np.vstack([vectorize_text(chunk, self.dim) for chunk in texts])
+            terms = [hash_terms(TOKEN_PATTERN.findall(chunk.lower())) for chunk in texts]
+            lengths = np.array([len(chunk) for chunk in chunks], dtype=np.int64)
+            term_counts = np.array([len(chunk_terms) for chunk_terms in terms], dtype=np.int64)
+            offsets = np.column_stack([
+                text_bytes + np.cumsum(lengths) - lengths,
+                lengths,
+                num_terms + np.cumsum(term_counts) - term_counts,
+                term_counts
+            ])
+
+            # release the memory maps before growing the files underneath them
+            self._matrix = None
+            self._offsets = None
+            self._terms = None
+            files = self._data_files()
+            append_to_file(files["vectors"], first_row * self.dim * 4, vectors.astype(np.float32).tobytes())
+            append_to_file(files["offsets"], first_row * 32, offsets.astype(np.int64).tobytes())
+            append_to_file(files["text"], text_bytes, b"".join(chunks))
+            append_to_file(files["terms"], num_terms * 4, np.concatenate(terms).tobytes())
+            self.doc_freq += (vectors > 0).sum(axis=0)
+
+        self.metadata["num_rows"] += len(chunks)
+        self.metadata["text_bytes"] += sum(len(chunk) for chunk in chunks)
+        self.metadata["num_terms"] += sum(len(chunk_terms) for chunk_terms in terms)
+        self.row_documents.extend([path] * len(chunks))
+        self.active = np.concatenate([self.active, np.ones(len(chunks), dtype=bool)])
+
+        stat = os.stat(file_path)
+        self.metadata["documents"][path] = {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "first_row": first_row,
+            "num_rows": len(chunks)
+        }
+        if save:
+            self.save()
+        return True
+
+    def add_directory(self, dir_path):
+        """Index every supported document under a directory. Returns the number of documents updated."""
+        updated = 0
+        try:
+            for root, _, files in os.walk(dir_path):
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() not in SUPPORTED_FILE_FORMATS:
+                        continue
+                    file_path = os.path.join(root, name)
+                    try:
+                        if self.add_document(file_path, save=False):
+                            print(f"Indexed {file_path}")
+                            updated += 1
+                    except Exception as e:
+                        print(f"Warning: Could not index {file_path}: {e}")
+        finally:
+            self.save()
+        return updated
+
+    def remove_document(self, file_path):
+        """Remove a document from the index."""
+        path = os.path.abspath(file_path)
+        if path not in self.metadata["documents"]:
+            return False
+        self._deactivate(path)
+        self.save()
+        return True
+
+    def search(self, query, top_k=LIBRARY_TOP_K):
+        """Return the top matching chunks across all indexed documents.
+
+        Only chunks that contain at least one of the query's words (other than
+        stop words) are returned, so a question the library can't answer gets no results.
+        """
+        query_terms = [term for term in set(TOKEN_PATTERN.findall(query.lower())) if term not in STOP_WORDS]
+        if not query_terms or not self.active.any():
+            return []
+        candidates = self._rows_with_terms(query_terms) & self.active
+        if not candidates.any():
+            return []
+        matrix = self._load_matrix()
+
+        # weight query terms by inverse document frequency over the active chunks
+        num_chunks = int(self.active.sum())
+        idf = np.log((1 + num_chunks) / (1 + self.doc_freq)) + 1
+        query_vector = (vectorize_text(query, self.dim) * idf).astype(np.float32)
+
+        scores = matrix @ query_vector
+        scores[~candidates] = -np.inf
+        top_k = min(top_k, int(candidates.sum()))
+        top_rows = np.argpartition(-scores, top_k - 1)[:top_k]
+        top_rows = top_rows[np.argsort(-scores[top_rows])]
+
+        results = []
+        offsets = self._load_offsets()
+        with open(self._data_files()["text"], "rb") as file:
+            for row in top_rows:
+                if scores[row] <= 0:
+                    break
+                offset, length = offsets[row, :2]
+                file.seek(int(offset))
+                path = self.row_documents[row]
+                results.append({
+                    "path": path,
+                    "section": int(row) - self.metadata["documents"][path]["first_row"] + 1,
+                    "text": file.read(int(length)).decode("utf-8"),
+                    "score": float(scores[row])
+                })
+        return results
+
+    def save(self):
+        """Save the index metadata, compacting first if enough rows are outdated."""
+        num_rows = self.metadata["num_rows"]
+        if num_rows and (num_rows - self.active.sum()) / num_rows > LIBRARY_COMPACT_RATIO:
+            self.compact()
+        else:
+            self._write_metadata()
+
+    def compact(self):
+        """Rewrite only the active rows into a new generation of data files."""
+        live_rows = np.flatnonzero(self.active)
+        old_files = self._data_files()
+        generation = self.metadata["generation"] + 1
+        new_files = self._data_files(generation)
+
+        matrix = self._load_matrix()
+        offsets = self._load_offsets()
+        all_terms = self._load_terms()
+        new_offsets = np.zeros((len(live_rows), 4), dtype=np.int64)
+        text_bytes = 0
+        num_terms = 0
+        with open(new_files["vectors"], "wb") as vectors_file:
+            for start in range(0, len(live_rows), SCAN_BLOCK_ROWS):
+                block = live_rows[start:start + SCAN_BLOCK_ROWS]
+                vectors_file.write(np.asarray(matrix[block]).tobytes())
+        with open(old_files["text"], "rb") as old_text, open(new_files["text"], "wb") as new_text:
+            for new_row, row in enumerate(live_rows):
+                offset, length = offsets[row, :2]
+                old_text.seek(int(offset))
+                new_text.write(old_text.read(int(length)))
+                new_offsets[new_row, :2] = (text_bytes, length)
+                text_bytes += int(length)
+        with open(new_files["terms"], "wb") as terms_file:
+            for new_row, row in enumerate(live_rows):
+                offset, count = offsets[row, 2:]
+                terms_file.write(np.asarray(all_terms[offset:offset + count]).tobytes())
+                new_offsets[new_row, 2:] = (num_terms, count)
+                num_terms += int(count)
+        with open(new_files["offsets"], "wb") as offsets_file:
+            offsets_file.write(new_offsets.tobytes())
+
+        # documents keep their rows contiguous and in order, so only the start moves
+        for entry in self.metadata["documents"].values():
+            entry["first_row"] = int(np.searchsorted(live_rows, entry["first_row"]))
+        self.metadata["generation"] = generation
+        self.metadata["num_rows"] = len(live_rows)
+        self.metadata["text_bytes"] = text_bytes
+        self.metadata["num_terms"] = num_terms
+        self._matrix = None
+        self._offsets = None
+        self._terms = None
+        self._write_metadata()
+        self._load_rows()
+
+        # close the old memory maps so the files can be removed on Windows too
+        del matrix, offsets, all_terms
+        for path in old_files.values():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _data_files(self, generation=None):
+        """Paths of the data files for a generation of the index."""
+        if generation is None:
+            generation = self.metadata["generation"]
+        return {
+            "vectors": os.path.join(self.index_dir, f"vectors-{generation}.f32"),
+            "offsets": os.path.join(self.index_dir, f"offsets-{generation}.i64"),
+            "text": os.path.join(self.index_dir, f"chunks-{generation}.txt"),
+            "terms": os.path.join(self.index_dir, f"terms-{generation}.u32")
+        }
+
+    def _load_rows(self):
+        """Map each row to its document and mark which rows are active."""
+        self.row_documents = [None] * self.metadata["num_rows"]
+        for path, entry in self.metadata["documents"].items():
+            for row in range(entry["first_row"], entry["first_row"] + entry["num_rows"]):
+                self.row_documents[row] = path
+        self.active = np.array([path is not None for path in self.row_documents], dtype=bool)
+
+    def _load_matrix(self):
+        """Memory-map the chunk vectors file."""
+        if self._matrix is None:
+            num_rows = self.metadata["num_rows"]
+            if num_rows == 0:
+                return np.zeros((0, self.dim), dtype=np.float32)
+            self._matrix = np.memmap(self._data_files()["vectors"], dtype=np.float32, mode="r", shape=(num_rows, self.dim))
+        return self._matrix
+
+    def _load_offsets(self):
+        """Memory-map the (text offset, text length, terms offset, terms count) of each row."""
+        if self._offsets is None:
+            num_rows = self.metadata["num_rows"]
+            if num_rows == 0:
+                return np.zeros((0, 4), dtype=np.int64)
+            self._offsets = np.memmap(self._data_files()["offsets"], dtype=np.int64, mode="r", shape=(num_rows, 4))
+        return self._offsets
+
+    def _load_terms(self):
+        """Memory-map the hashed terms of all rows."""
+        if self._terms is None:
+            num_terms = self.metadata["num_terms"]
+            if num_terms == 0:
+                return np.zeros(0, dtype=np.uint32)
+            self._terms = np.memmap(self._data_files()["terms"], dtype=np.uint32, mode="r", shape=(num_terms,))
+        return self._terms
+
+    def _rows_with_terms(self, terms):
+        """Mark the rows that contain any of the terms."""
+        rows = np.zeros(self.metadata["num_rows"], dtype=bool)
+        positions = np.flatnonzero(np.isin(self._load_terms(), hash_terms(terms)))
+        if len(positions):
+            # rows without terms share their start with the next row, so take the last row starting at or before
+            starts = np.asarray(self._load_offsets()[:, 2])
+            rows[np.searchsorted(starts, positions, side="right") - 1] = True
+        return rows
+
+    def _deactivate(self, path):
+        """Drop a document from the metadata and mark its rows as inactive."""
+        entry = self.metadata["documents"].pop(path, None)
+        if entry is None or not entry["num_rows"]:
+            return
+        rows = slice(entry["first_row"], entry["first_row"] + entry["num_rows"])
+        self.doc_freq -= (np.asarray(self._load_matrix()[rows]) > 0).sum(axis=0)
+        self.active[rows] = False
+        self.row_documents[rows] = [None] * entry["num_rows"]
+
+    def _write_metadata(self):
+        """Atomically replace the metadata file."""
+        temp_path = self.metadata_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self.metadata, file)
+        os.replace(temp_path, self.metadata_path)
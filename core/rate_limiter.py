@@ -0,0 +1,167 @@
+import re
+import random
+import threading
+import time
+from collections import deque
+from google.api_core import exceptions as google_exceptions
+
+RATE_LIMIT_ERRORS = (google_exceptions.TooManyRequests,)
+TRANSIENT_ERRORS = (
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.DeadlineExceeded,
+    TimeoutError
+)
+TRANSIENT_STATUS_CODES = {500, 502, 503, 504}
+WINDOW_SECONDS = 60
+# only used for errors without a status code anywhere in their chain
+RATE_LIMIT_PATTERN = re.compile(r"\b429\b|\bresource ?exhausted\b|\brate limit(ed)?\b|\bquota exceeded\b")
+TRANSIENT_PATTERN = re.compile(r"\b50[0234]\b|\bservice unavailable\b|\bdeadline exceeded\b|\btimed out\b")
+
+def get_status_code(error):
+    """Get the HTTP status code of an API error, if it has one."""
+    for attr in ("code", "status_code"):
+        code = getattr(error, attr, None)
+        if callable(code):
+            continue
+        try:
+            return int(code)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+def classify_error(error):
+    """Classify a model error as "rate_limit", "transient" or None if it should not be retried.
+
+    The error's type or status code decides when there is one, also on the
+    errors it was raised from. The message is only checked as a last resort.
+    """
+    cause = error
+    while cause is not None:
+        if isinstance(cause, RATE_LIMIT_ERRORS):
+            return "rate_limit"
+        if isinstance(cause, TRANSIENT_ERRORS):
+            return "transient"
+        code = get_status_code(cause)
+        if code is not None:
+            if code == 429:
+                return "rate_limit"
+            return "transient" if code in TRANSIENT_STATUS_CODES else None
+        cause = cause.__cause__ or cause.__context__
+
+    message = f"{type(error).__name__} {error}".lower()
+    if RATE_LIMIT_PATTERN.search(message):
+        return "rate_limit"
+    if TRANSIENT_PATTERN.search(message):
+        return "transient"
+    return None
+
+def estimate_tokens(messages, max_output_tokens=0):
+    """Roughly estimate the tokens a request uses (about 4 characters per token)."""
+    characters = sum(len(str(message.content)) for message in messages)
+    return characters // 4 + max_output_tokens
+
+class SlidingWindow:
+    """Amounts used over the last 60 seconds, kept within a per-minute limit."""
+
+    def __init__(self, limit_per_minute, clock=time.monotonic):
+        self.limit_per_minute = limit_per_minute
+        self.clock = clock
+        self.events = deque()
+        self.total = 0
+
+    def expire(self):
+        now = self.clock()
+        while self.events and self.events[0][0] + WINDOW_SECONDS <= now:
+            self.total -= self.events.popleft()[1]
+
+    def time_until_available(self, amount):
+        """Seconds to wait before the amount can be used without going over the limit."""
+        self.expire()
+        # a single amount larger than the limit waits for an empty window
+        amount = min(amount, self.limit_per_minute)
+        excess = self.total + amount - self.limit_per_minute
+        if excess <= 0:
+            return 0
+        freed = 0
+        for sent_at, used in self.events:
+            freed += used
+            if freed >= excess:
+                # a little extra so the event has expired once the wait is over
+                return sent_at + WINDOW_SECONDS - self.clock() + 1e-6
+        return WINDOW_SECONDS
+
+    def consume(self, amount):
+        self.events.append((self.clock(), amount))
+        self.total += amount
+
+class RateLimiter:
+    """Client-side limiter on requests/min and tokens/min.
+
+    Requests and tokens are counted over a sliding 60 second window, so no
+    minute ever goes over the limits. The request limit backs off when the API
+    throttles us and recovers gradually after successful calls.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, clock=time.monotonic, sleep=time.sleep):
+        self.max_requests_per_minute = requests_per_minute
+        self.requests = SlidingWindow(requests_per_minute, clock)
+        self.tokens = SlidingWindow(tokens_per_minute, clock)
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens, deadline=None):
+        """Block until a request using the given tokens fits within the limits."""
+        while True:
+            with self.lock:
+                wait = max(self.requests.time_until_available(1), self.tokens.time_until_available(tokens))
+                if wait == 0:
+                    self.requests.consume(1)
+                    self.tokens.consume(tokens)
+                    return
+            if deadline is not None and self.clock() + wait > deadline:
+                raise TimeoutError("Waiting for the rate limit would exceed the request deadline")
+            self.sleep(wait)
+
+    def penalize(self):
+        """Halve the request limit after the API throttled a request."""
+        with self.lock:
+            self.requests.limit_per_minute = max(1, self.requests.limit_per_minute // 2)
+
+    def reward(self):
+        """Recover the request limit by one request/min after a successful call."""
+        with self.lock:
+            self.requests.limit_per_minute = min(self.max_requests_per_minute, self.requests.limit_per_minute + 1)
+
+def invoke_with_retry(model, messages, limiter, max_retries, base_delay, max_delay, deadline_seconds, attempt_timeout=0, max_output_tokens=0):
+    """Invoke the model within the rate limits, retrying throttling and transient errors.
+
+    Retries use exponential backoff with full jitter. The model is expected to
+    give up on an attempt after attempt_timeout seconds (its own client timeout),
+    so an attempt is only started while it can finish before the call's deadline.
+    """
+    deadline = limiter.clock() + deadline_seconds
+    start_by = deadline - attempt_timeout
+    tokens = estimate_tokens(messages, max_output_tokens)
+
+    for attempt in range(max_retries + 1):
+        limiter.acquire(tokens, start_by)
+        try:
+            response = model.invoke(messages)
+        except Exception as e:
+            error_type = classify_error(e)
+            if attempt == max_retries or error_type is None:
+                raise
+            if error_type == "rate_limit":
+                limiter.penalize()
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            if limiter.clock() + delay > start_by:
+                raise
+            print(f"Warning: Model request failed ({e}), retrying in {delay:.1f}s...")
+            limiter.sleep(delay)
+            continue
+        limiter.reward()
+        return response
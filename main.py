@@ -7,7 +7,8 @@ import pyfiglet
 
 from config.settings import initialize_settings
 from core.document_processor import process_file
-from core.cli import display_menu, display_qa_menu, handle_qa_mode
+from core.cli import display_menu, display_qa_menu, handle_qa_mode, handle_library_qa_mode
+from core.library_index import LibraryIndex
 from core.text_chunker import chunk_text
 from core.ai_service import summarize_text_to_bullets
 from utils.file_helpers import get_file_path
@@ -28,12 +29,20 @@ def main():
         document_text = process_file(file_path)
         print("File processed successfully!")
         
+        library_index = None
+
         while True:
             choice = display_menu()
             
             if choice == 1:
                 print("\nGenerating summary and bullet points, please wait...")
-                result = summarize_text_to_bullets(document_text)
+                try:
+                    result = summarize_text_to_bullets(document_text)
+                except Exception as e:
+                    # completed parts are kept, so trying again only redoes the failed ones
+                    print(f"\nError generating summary: {e}")
+                    print("You can choose the option again to retry the remaining parts")
+                    continue
                 print("\n" + "-"*50)
                 print("Summary and Key Points".center(50))
                 print("-"*50)
@@ -43,6 +52,20 @@ def main():
                 handle_qa_mode(document_text)
             
             elif choice == 3:
+                if library_index is None:
+                    print("\nLoading course library, please wait...")
+                    try:
+                        index = LibraryIndex()
+                        # keep the current document in the library
+                        if index.add_document(file_path, document_text):
+                            print("Added the current document to the library.")
+                    except Exception as e:
+                        print(f"\nError loading course library: {e}")
+                        continue
+                    library_index = index
+                handle_library_qa_mode(library_index)
+            
+            elif choice == 4:
                 print("\nExiting program.. Goodbye!")
                 break
     
@@ -0,0 +1,114 @@
+import unittest
+from collections import deque
+from google.api_core import exceptions as google_exceptions
+
+from core.rate_limiter import RateLimiter, classify_error, invoke_with_retry
+
+class FakeClock:
+    """Clock that only moves when something sleeps."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+class Message:
+    def __init__(self, content):
+        self.content = content
+
+class Response:
+    content = "ok"
+
+class FakeModel:
+    """Model with a per-minute request quota that throttles like the API does."""
+
+    def __init__(self, clock, requests_per_minute, latency=1.0, errors=None):
+        self.clock = clock
+        self.requests_per_minute = requests_per_minute
+        self.latency = latency
+        self.errors = deque(errors or [])
+        self.sent = []
+        self.throttled = 0
+
+    def invoke(self, messages):
+        recent = [sent_at for sent_at in self.sent if sent_at > self.clock() - 60]
+        self.sent.append(self.clock())
+        self.clock.sleep(self.latency)
+        if len(recent) >= self.requests_per_minute:
+            self.throttled += 1
+            raise google_exceptions.ResourceExhausted("quota exceeded")
+        if self.errors:
+            raise self.errors.popleft()
+        return Response()
+
+def max_in_window(times, window=60):
+    return max(sum(1 for other in times if start <= other < start + window) for start in times)
+
+class RateLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(15, 1000000, clock=self.clock, sleep=self.clock.sleep)
+
+    def invoke(self, model, **kwargs):
+        options = dict(max_retries=5, base_delay=1, max_delay=60, deadline_seconds=300, attempt_timeout=10)
+        options.update(kwargs)
+        return invoke_with_retry(model, [Message("x" * 400)], self.limiter, **options)
+
+    def test_no_minute_goes_over_the_request_limit(self):
+        model = FakeModel(self.clock, requests_per_minute=15)
+        for _ in range(30):
+            self.invoke(model)
+        self.assertEqual(model.throttled, 0)
+        self.assertLessEqual(max_in_window(model.sent), 15)
+
+    def test_no_minute_goes_over_the_token_limit(self):
+        limiter = RateLimiter(1000, 1000, clock=self.clock, sleep=self.clock.sleep)
+        sent = []
+        for _ in range(10):
+            limiter.acquire(300)
+            sent.append(self.clock())
+        self.assertLessEqual(max_in_window(sent), 3)
+
+    def test_throttling_is_retried_and_backs_off(self):
+        model = FakeModel(self.clock, requests_per_minute=100, errors=[
+            google_exceptions.ResourceExhausted("quota exceeded"),
+            google_exceptions.ServiceUnavailable("unavailable")
+        ])
+        self.assertEqual(self.invoke(model).content, "ok")
+        self.assertEqual(len(model.sent), 3)
+        # halved once for the 429, then recovered by one for the success
+        self.assertEqual(self.limiter.requests.limit_per_minute, 8)
+
+    def test_client_errors_are_not_retried(self):
+        model = FakeModel(self.clock, requests_per_minute=100, errors=[google_exceptions.InvalidArgument("bad")])
+        with self.assertRaises(google_exceptions.InvalidArgument):
+            self.invoke(model)
+        self.assertEqual(len(model.sent), 1)
+
+    def test_call_never_runs_past_its_deadline(self):
+        model = FakeModel(self.clock, requests_per_minute=100, latency=10, errors=[
+            google_exceptions.DeadlineExceeded("timed out") for _ in range(10)
+        ])
+        with self.assertRaises((google_exceptions.DeadlineExceeded, TimeoutError)):
+            self.invoke(model, deadline_seconds=35, base_delay=0.1, max_delay=0.1)
+        self.assertLessEqual(self.clock(), 35)
+
+    def test_classify_error(self):
+        class CodedError(Exception):
+            def __init__(self, code, message):
+                super().__init__(message)
+                self.code = code
+
+        self.assertEqual(classify_error(google_exceptions.ResourceExhausted("quota")), "rate_limit")
+        self.assertEqual(classify_error(google_exceptions.InternalServerError("oops")), "transient")
+        self.assertEqual(classify_error(CodedError(503, "unavailable")), "transient")
+        self.assertIsNone(classify_error(CodedError(400, "quota exceeded")))
+        self.assertIsNone(classify_error(ValueError("Invalid argument: 1500 chars")))
+        self.assertEqual(classify_error(Exception("429 Too Many Requests")), "rate_limit")
+
+if __name__ == "__main__":
+    unittest.main()